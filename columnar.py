@@ -0,0 +1,193 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+import json
+import os
+
+from tqdm import tqdm
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from helpers import Video, Caption, Word
+import subtitles_segmentations as ss
+
+# One row per word. Captions without words and videos without captions get one row in
+# which the fields of the missing caption and word are null, so that they are not lost.
+SCHEMA_FIELDS = [('video_id', 'string'),
+                 ('category_path', 'string'),
+                 ('file_path', 'string'),
+                 ('caption', 'int32'),
+                 ('is_word_aligned', 'bool_'),
+                 ('caption_start', 'float64'),
+                 ('caption_end', 'float64'),
+                 ('index', 'int32'),
+                 ('text', 'string'),
+                 ('start', 'float64'),
+                 ('end', 'float64'),
+                 ('pos', 'string'),
+                 ('dep', 'string'),
+                 ('head', 'int32')]
+
+
+def _check_pyarrow() -> None:
+    if pa is None:
+        raise ImportError('pyarrow is needed to export and import Parquet files. Install it using:'
+                          '\n\n\tpip install pyarrow\n')
+
+
+def schema(metadata: Optional[Dict[str, str]] = None):
+    _check_pyarrow()
+    return pa.schema([(name, getattr(pa, type_)()) for name, type_ in SCHEMA_FIELDS],
+                     metadata=metadata)
+
+
+def _video_rows(video_id: str, category_path: str, video: Video) -> Dict[str, List]:
+    columns: Dict[str, List] = {name: [] for name, _ in SCHEMA_FIELDS}
+
+    def append(*row):
+        row = (video_id, category_path, video.file_path) + row
+        row += (None,) * (len(SCHEMA_FIELDS) - len(row))
+        for (name, _), value in zip(SCHEMA_FIELDS, row):
+            columns[name].append(value)
+
+    index = 0
+    for c, caption in enumerate(video.captions):
+        if not caption:
+            append(c, caption.is_word_aligned, caption.start, caption.end)
+        for word in caption:
+            append(c, caption.is_word_aligned, caption.start, caption.end, index,
+                   word.text, word.start, word.end, word.pos, word.dep, word.head)
+            index += 1
+    if not video.captions:
+        append()
+    return columns
+
+
+def export_parquet(videos: ss.SubtitleReader,
+                   path: TextIO,
+                   row_group_size: int = 100000) -> None:
+    """Writes the annotated corpus as a Parquet dataset with one row per word (see
+    `SCHEMA_FIELDS`), partitioned by top level category, i.e., one directory
+    `path/category=<name>/` per category. Rows are written in row groups of
+    `row_group_size` words as the videos are traversed, so that the whole table never
+    has to be held in memory. `videos.duplicates` is stored in the metadata of the schema.
+
+    Args:
+        videos (ss.SubtitleReader): Object containing all the subtitles.
+        path (TextIO): Directory of the dataset.
+        row_group_size (int, optional): Number of rows per row group. Defaults to 100000.
+    """
+    _check_pyarrow()
+    schema_ = schema({'duplicates': json.dumps(getattr(videos, 'duplicates', {}))})
+    writers: Dict[str, pq.ParquetWriter] = {}
+    buffers: Dict[str, Dict[str, List]] = {}
+
+    def flush(category: str, size: int) -> None:
+        """Writes the first `size` rows of the buffer of a category as one row group."""
+        buffer = buffers[category]
+        if category not in writers:
+            os.makedirs(os.path.join(path, f'category={category}'), exist_ok=True)
+            writers[category] = pq.ParquetWriter(
+                os.path.join(path, f'category={category}', 'part-0.parquet'), schema_)
+        writers[category].write_table(
+            pa.table({name: values[:size] for name, values in buffer.items()}, schema=schema_),
+            row_group_size=size)
+        buffers[category] = {name: values[size:] for name, values in buffer.items()}
+
+    for category_path, video_id, video in tqdm(videos.iter_with_categories(),
+                                               total=len(videos.id_to_vid)):
+        category = category_path[0] if category_path else ''
+        buffer = buffers.setdefault(category, {name: [] for name, _ in SCHEMA_FIELDS})
+        for name, values in _video_rows(video_id, '/'.join(category_path), video).items():
+            buffer[name] += values
+        while len(buffers[category]['video_id']) >= row_group_size:
+            flush(category, row_group_size)
+    for category, buffer in buffers.items():
+        if buffer['video_id']:
+            flush(category, len(buffer['video_id']))
+    for writer in writers.values():
+        writer.close()
+
+
+def read_parquet(path: TextIO,
+                 categories: Optional[Iterable[str]] = None,
+                 columns: Optional[List[str]] = None):
+    """Reads the dataset written by `export_parquet()` as a `pyarrow.Table`. Only the
+    partitions of the given top level categories are read.
+
+    Args:
+        path (TextIO): Directory of the dataset.
+        categories (Optional[Iterable[str]], optional): Categories to read. Defaults to
+        all of them.
+        columns (Optional[List[str]], optional): Columns to read. Defaults to all of them.
+    """
+    _check_pyarrow()
+    partitioning = ds.partitioning(pa.schema([('category', pa.string())]), flavor='hive')
+    dataset = ds.dataset(path, format='parquet', partitioning=partitioning)
+    filter_ = None
+    if categories is not None:
+        filter_ = ds.field('category').isin(list(categories))
+    return dataset.to_table(columns=columns, filter=filter_)
+
+
+def load_parquet(path: TextIO,
+                 categories: Optional[Iterable[str]] = None) -> ss.SubtitleReader:
+    """Rebuilds a `SubtitleReader` object from the dataset written by `export_parquet()`
+    without parsing the vtt files again. As in `SubtitleReader.read_videos()`, a video
+    which appears in several categories is a single `Video` object, and `duplicates`
+    is restored.
+
+    Args:
+        path (TextIO): Directory of the dataset.
+        categories (Optional[Iterable[str]], optional): Categories to load. Defaults to
+        all of them.
+    """
+    table = read_parquet(path, categories=categories,
+                         columns=[name for name, _ in SCHEMA_FIELDS])
+    videos = ss.SubtitleReader.__new__(ss.SubtitleReader)
+    videos.vtt_folder = None
+    videos.videos, videos.id_to_vid = {}, {}
+    # (category path, video ID) -> video to which the rows are added, or None for the
+    # other occurrences of a video which is shared between categories
+    loaded: Dict[Tuple[str, str], Optional[Video]] = {}
+    # Rows are written video by video and word by word, so consecutive rows belong to
+    # the same video and caption
+    for batch in table.to_batches():
+        columns = batch.to_pydict()
+        for row in zip(*(columns[name] for name, _ in SCHEMA_FIELDS)):
+            (video_id, category_path, file_path, c, is_word_aligned, caption_start,
+             caption_end, index, text, start, end, pos, dep, head) = row
+            key = (category_path, video_id)
+            if key not in loaded:
+                video = videos.id_to_vid.get(video_id)
+                # Videos shared by `read_videos()` are written with the same file path
+                shared = video is not None and video.file_path == file_path
+                if not shared:
+                    video = Video.__new__(Video)
+                    video.file_path = file_path
+                    video.file_name = os.path.basename(file_path.replace('.en.vtt', ''))
+                    video.captions = []
+                    videos.id_to_vid.setdefault(video_id, video)
+                loaded[key] = None if shared else video
+                tree = videos.videos
+                for branch in category_path.split('/') if category_path else []:
+                    tree = tree.setdefault(branch, {})
+                tree[video_id] = video
+            video = loaded[key]
+            if video is None or c is None:
+                continue
+            if len(video.captions) == c:
+                video.captions.append(Caption(is_word_aligned=is_word_aligned,
+                                              start=caption_start,
+                                              end=caption_end))
+            if index is not None:
+                video.captions[c].append(Word(text=text, start=start, end=end,
+                                              pos=pos, dep=dep, head=head))
+    metadata = table.schema.metadata or {}
+    duplicates = json.loads(metadata.get(b'duplicates', b'{}'))
+    videos.duplicates = {id: p for id, p in duplicates.items() if id in videos.id_to_vid}
+    return videos
@@ -12,11 +12,50 @@ pattern_word = r"<c>(.*?)</c>"
 pattern_first = r".*?<[0-9:.]+>"
 pattern_rest = r"<[0-9:.]+><c>\s.*?</c>"
 
-try:
-    model = spacy.load("en_core_web_trf")
-except:
-    model = None
-    print('The TRF Spacy model is not available. Either download it using:\n\n\tpython -m spacy download en_core_web_trf\n\nor do not use any function which might need it.')
+# spaCy English pipelines from the fastest and least accurate to the slowest and most accurate
+TIERS = {'sm': 'en_core_web_sm',
+         'md': 'en_core_web_md',
+         'lg': 'en_core_web_lg',
+         'trf': 'en_core_web_trf'}
+
+
+class Annotator:
+    def __init__(self, tier: str = 'trf') -> None:
+        """Wraps one of the spaCy pipelines (see `TIERS`) which is only loaded the first
+        time it is used. Any object which implements `__call__()` and `pipe()` and returns
+        spaCy-like documents can be used in its place.
+
+        Args:
+            tier (str, optional): One of 'sm', 'md', 'lg' or 'trf'. Defaults to 'trf'.
+        """
+        if tier not in TIERS:
+            raise ValueError(f'Unknown tier {tier!r}, expected one of {list(TIERS)}.')
+        self.tier = tier
+        self.name = TIERS[tier]
+        self._nlp = None
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            try:
+                self._nlp = spacy.load(self.name)
+            except OSError as e:
+                raise OSError(f'The {self.name} spaCy model is not available. Download it using:'
+                              f'\n\n\tpython -m spacy download {self.name}\n') from e
+        return self._nlp
+
+    def __call__(self, text: str):
+        return self.nlp(text)
+
+    def pipe(self, texts, **kwargs):
+        return self.nlp.pipe(texts, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"Annotator({self.tier!r})"
+
+
+# Default annotator, the tier of which can be chosen for a run with the XAINES_SPACY_TIER variable
+model = Annotator(os.environ.get('XAINES_SPACY_TIER', 'trf'))
 
 class Word:
     def __init__(self,
@@ -90,24 +129,31 @@ class Video:
         self._preprocess()
 
     def _preprocess(self):
+        """Splits the words which contain spaces (a single vtt tag sometimes wraps several
+        words) and distributes the time span of the original word evenly between them,
+        starting from its `start`. Only the captions which contain such words are rebuilt.
+        """
         for caption in self.captions:
+            if ' ' not in '\n'.join([word.text for word in caption.words]):
+                continue
             words_ = []
-            for word in caption:
-                if ' ' in word.text:
-                    split_words = []
-                    split = word.text.split()
-                    n = len(split)
-                    timestamps_diff = word.end - word.start
-                    timestamps = [timestamps_diff *
-                                  i / n for i in range(n + 1)]
-                    for i in range(n):
-                        word_ = Word(text=split[i],
-                                     start=timestamps[i],
-                                     end=timestamps[i + 1])
-                        split_words.append(word_)
-                    words_ += split_words
-                else:
+            for word in caption.words:
+                if ' ' not in word.text:
                     words_.append(word)
+                    continue
+                split = word.text.split()
+                n = len(split)
+                if word.start is None or word.end is None:
+                    # The first word keeps the original start, the others cannot be estimated
+                    timestamps = [word.start] + [None] * n
+                else:
+                    timestamps_diff = word.end - word.start
+                    timestamps = [word.start + timestamps_diff * i / n
+                                  for i in range(n + 1)]
+                for i in range(n):
+                    words_.append(Word(text=split[i],
+                                       start=timestamps[i],
+                                       end=timestamps[i + 1]))
             caption.words = words_
 
     def __len__(self) -> int:
@@ -131,12 +177,16 @@ class Video:
     def words(self) -> List[Word]:
         return [word for caption in self.captions for word in caption]
 
+    def analyze(self, annotator: Optional[Annotator] = None):
+        """Use a spaCy model to analyze a video (sentence segmentation, syntaxtic
+        relations, POS tagging). The default annotator (`model`) is used if none is given.
+        """
+        return (annotator or model)(str(self))
+
     @property
     def analysis(self):
-        """Use the available spaCy model to analyze a video (sentence segmentation,
-        syntaxtic relations, POS tagging).
-        """
-        return model(str(self))
+        """Analysis of the video with the default annotator (see `analyze()`)."""
+        return self.analyze()
 
     @property
     def sentences(self):
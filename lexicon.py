@@ -0,0 +1,147 @@
+from collections import Counter, namedtuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import string
+
+from helpers import Word
+
+# Irregular plurals which cannot be derived from the singular with the usual rules
+IRREGULAR_PLURALS = {'foot': 'feet', 'tooth': 'teeth', 'calf': 'calves',
+                     'knife': 'knives', 'leaf': 'leaves', 'half': 'halves',
+                     'man': 'men', 'woman': 'women', 'child': 'children',
+                     'person': 'people', 'mouse': 'mice'}
+
+Match = namedtuple('Match', ['lexicon', 'term', 'start', 'end'])
+
+
+def normalize(text: str) -> str:
+    """Case-fold a word and strip the punctuation which sticks to it in the captions
+    (e.g., "Arm," -> "arm")."""
+    return text.strip(string.punctuation).casefold()
+
+
+def pluralize(term: str) -> List[str]:
+    """Returns the plural forms of a (possibly multi-word) term. Only the last word
+    of the term is inflected, e.g., "lower back" -> "lower backs"."""
+    *rest, last = term.split()
+    if last in IRREGULAR_PLURALS:
+        plurals = [IRREGULAR_PLURALS[last]]
+    elif last.endswith(('s', 'x', 'z', 'ch', 'sh')):
+        plurals = [last + 'es']
+    elif last.endswith('y') and last[-2:-1] not in 'aeiou':
+        plurals = [last[:-1] + 'ies']
+    else:
+        plurals = []
+    # The naive plural is always kept since that is what we used to match against
+    plurals.append(last + 's')
+    return [' '.join(rest + [plural]) for plural in plurals]
+
+
+class LexiconMatcher:
+    def __init__(self,
+                 lexicons: Dict[str, Iterable[str]],
+                 inflect: bool = True) -> None:
+        """Compiles several term lists (lexicons) into a single hashed n-gram table so
+        that all of them can be matched in one pass over the words of a video. Terms can
+        span multiple words and are matched case-insensitively.
+
+        Args:
+            lexicons (Dict[str, Iterable[str]]): Mapping between the name of each lexicon
+            (e.g., 'body_parts') and its terms, given in their base (lemma) form.
+            inflect (bool, optional): If `True`, the plural forms of each term are also
+            matched and are mapped back to the base form. Defaults to True.
+        """
+        self.lexicons = list(lexicons)
+        # n-gram (tuple of normalized words) -> list of (lexicon, lemma)
+        self.table: Dict[Tuple[str, ...], List[Tuple[str, str]]] = {}
+        # first word of an n-gram -> possible n-gram lengths, longest first
+        self.lengths: Dict[str, List[int]] = {}
+        for name, terms in lexicons.items():
+            for term in terms:
+                lemma = ' '.join(w for w in map(normalize, term.split()) if w)
+                if not lemma:
+                    raise ValueError(f'The term {term!r} of the lexicon {name!r} does not '
+                                     'contain any word.')
+                forms = [lemma] + (pluralize(lemma) if inflect else [])
+                for form in forms:
+                    self._add(tuple(form.split()), name, lemma)
+
+    def _add(self, ngram: Tuple[str, ...], lexicon: str, lemma: str) -> None:
+        entries = self.table.setdefault(ngram, [])
+        if (lexicon, lemma) not in entries:
+            entries.append((lexicon, lemma))
+        lengths = self.lengths.setdefault(ngram[0], [])
+        if len(ngram) not in lengths:
+            lengths.append(len(ngram))
+            lengths.sort(reverse=True)
+
+    def __contains__(self, text: str) -> bool:
+        return tuple(normalize(w) for w in text.split()) in self.table
+
+    def match(self,
+              words: Sequence[Word],
+              pos: Optional[str] = None) -> List[Match]:
+        """Finds all the lexicon terms in a sequence of words. Within each lexicon, the
+        longest term is preferred at each position and matches do not overlap; the lexicons
+        do not affect each other (e.g., "leg press" in one lexicon does not hide "leg" in
+        another one).
+
+        Args:
+            words (Sequence[Word]): Words to search, e.g., `video.words`.
+            pos (Optional[str], optional): If given, the last word of a match must have
+            this POS (`Word.pos` may contain several tags joined with '+' if spaCy split
+            the word). Defaults to None.
+
+        Returns:
+            List[Match]: One `Match` per term occurrence and lexicon, where `start` and
+            `end` are the indexes of the matched span in `words`.
+        """
+        normalized = [normalize(word.text) for word in words]
+        matches: List[Match] = []
+        # lexicon -> index of the first word which is not part of one of its matches
+        free: Dict[str, int] = {}
+        for i in range(len(words)):
+            # lexicon -> length of its match starting at this position
+            matched: Dict[str, int] = {}
+            for n in self.lengths.get(normalized[i], []):
+                if i + n > len(words):
+                    continue
+                entries = self.table.get(tuple(normalized[i:i + n]))
+                if entries is None:
+                    continue
+                head_pos = words[i + n - 1].pos
+                if pos is not None and (not head_pos or pos not in head_pos.split('+')):
+                    continue
+                for lexicon, lemma in entries:
+                    if free.get(lexicon, 0) > i or matched.get(lexicon, n) != n:
+                        continue
+                    matched[lexicon] = n
+                    matches.append(Match(lexicon, lemma, i, i + n))
+            for lexicon, n in matched.items():
+                free[lexicon] = i + n
+        return matches
+
+    def counts(self,
+               videos,
+               pos: Optional[str] = None) -> Tuple[Dict[str, Dict[str, Counter]], int]:
+        """Counts the lexicon terms in all of the videos in one pass.
+
+        Args:
+            videos (SubtitleReader): Object containing all the subtitles.
+            pos (Optional[str], optional): See `match()`. Defaults to None.
+
+        Returns:
+            Tuple[Dict, int]: The first dictionary maps each category path (joined with '/')
+            to one `Counter` of terms (in their base form) per lexicon. The integer is the total number
+            of words which were searched.
+        """
+        counts: Dict[str, Dict[str, Counter]] = {}
+        total_words = 0
+        for path, _, video in videos.iter_with_categories():
+            category = '/'.join(path)
+            words = video.words
+            total_words += len(words)
+            category_counts = counts.setdefault(
+                category, {name: Counter() for name in self.lexicons})
+            for match in self.match(words, pos=pos):
+                category_counts[match.lexicon].update([match.term])
+        return counts, total_words
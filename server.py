@@ -0,0 +1,246 @@
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse
+from urllib.request import urlopen
+from collections import Counter, OrderedDict, namedtuple
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import threading
+import time
+
+import utils
+from lexicon import normalize
+import subtitles_segmentations as ss
+
+# Analyses from `utils` which can be queried, with the types of their parameters
+ANALYSES = {
+    'body_parts_counts': (lambda videos: utils.body_parts_counts(videos), {}),
+    'lexicon_counts': (lambda videos, pos=None: utils.LEXICON_MATCHER.counts(videos, pos=pos),
+                       {'pos': str}),
+    'analyze_pos_dep': (utils.analyze_pos_dep, {'n': int, 'depth': int, 'seed': int}),
+    'confidence_intervals': (utils.get_confidence_intervals,
+                             {'n': int, 'depth': int, 'seed': int, 'level': float,
+                              'n_bootstrap': int}),
+    'verb_contexts_distribution': (utils.verb_contexts_distribution, {'window': int}),
+}
+
+
+def to_json(value: Any) -> Any:
+    """Converts the results of the analyses to JSON compatible objects. Tuple keys
+    (e.g., the `dep_pos` features) are joined with '|'."""
+    if isinstance(value, dict):
+        return {('|'.join(map(str, k)) if isinstance(k, tuple) else str(k)): to_json(v)
+                for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+# Parameters of the other endpoints (see `QueryService._run()`)
+ENDPOINT_PARAMS = {'words': {'text', 'window', 'category', 'limit'},
+                   'videos': {'words'},
+                   'categories': set()}
+
+# Everything which is derived from one version of the pickle file, so that it can be
+# swapped in a single assignment while other threads are reading it
+Corpus = namedtuple('Corpus', ['version', 'videos', 'categories', 'category_counts',
+                               'words', 'index'])
+
+
+class QueryService:
+    def __init__(self, save_path: str, cache_size: int = 1024) -> None:
+        """Keeps the `SubtitleReader` object loaded from `save_path` in memory with an index
+        of its words, and caches the results of the last `cache_size` queries. The corpus
+        version is the modification time and size of the pickle file; if the file changes,
+        the corpus is reloaded and the cache is cleared.
+
+        Args:
+            save_path (str): Path of the `pickle` file of the `SubtitleReader` object.
+            cache_size (int, optional): Maximum number of cached results. Defaults to 1024.
+        """
+        self.save_path = save_path
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.corpus: Corpus = None
+        self.cache: OrderedDict[Tuple, Any] = OrderedDict()
+        self._reload_if_changed()
+
+    def _reload_if_changed(self) -> None:
+        stat = os.stat(self.save_path)
+        version = f'{stat.st_mtime_ns}-{stat.st_size}'
+        with self.lock:
+            if self.corpus is not None and version == self.corpus.version:
+                return
+            videos = ss.SubtitleReader.load(self.save_path)
+            # The category and words of a video ID are those of its first occurrence, but
+            # the videos of each category are counted with all the occurrences
+            categories: Dict[str, str] = {}
+            category_counts = Counter()
+            words: Dict[str, List] = {}
+            # normalized word -> positions (video ID, word index)
+            index: Dict[str, List[Tuple[str, int]]] = {}
+            for path, video_id, video in videos.iter_with_categories():
+                category_counts['/'.join(path)] += 1
+                if video_id in categories:
+                    continue
+                categories[video_id] = '/'.join(path)
+                words[video_id] = video.words
+                for i, word in enumerate(words[video_id]):
+                    index.setdefault(normalize(word.text), []).append((video_id, i))
+            self.corpus = Corpus(version, videos, categories, category_counts, words, index)
+            self.cache = OrderedDict()
+
+    @property
+    def version(self) -> str:
+        return self.corpus.version
+
+    @staticmethod
+    def _params(endpoint: str, params: Dict[str, str]) -> Dict[str, str]:
+        """Drops the parameters which the endpoint does not use, so that they do not
+        change the cache key."""
+        parts = endpoint.strip('/').split('/')
+        if parts[0] == 'analyses' and len(parts) == 2 and parts[1] in ANALYSES:
+            names = ANALYSES[parts[1]][1]
+        else:
+            names = ENDPOINT_PARAMS.get(parts[0], ())
+        return {name: value for name, value in params.items() if name in names}
+
+    def query(self, endpoint: str, params: Dict[str, str]) -> Dict[str, Any]:
+        self._reload_if_changed()
+        corpus = self.corpus
+        params = self._params(endpoint, params)
+        key = (endpoint, tuple(sorted(params.items())), corpus.version)
+        with self.lock:
+            result = self.cache.get(key)
+            cached = result is not None
+            if cached:
+                self.cache.move_to_end(key)
+        if not cached:
+            result = to_json(self._run(corpus, endpoint, params))
+            with self.lock:
+                if corpus is self.corpus:
+                    self.cache[key] = result
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return {'corpus_version': corpus.version, 'cached': cached, 'result': result}
+
+    def _run(self, corpus: Corpus, endpoint: str, params: Dict[str, str]) -> Any:
+        parts = endpoint.strip('/').split('/')
+        if parts[0] == 'analyses' and len(parts) == 2:
+            if parts[1] not in ANALYSES:
+                raise KeyError(f'Unknown analysis {parts[1]!r}, expected one of {list(ANALYSES)}.')
+            function, types = ANALYSES[parts[1]]
+            kwargs = {name: types[name](value) for name, value in params.items()}
+            return function(corpus.videos, **kwargs)
+        if parts[0] == 'words' and len(parts) == 1:
+            if 'text' not in params:
+                raise ValueError("Missing parameter 'text'.")
+            return self.contexts(params['text'],
+                                 window=int(params.get('window', 5)),
+                                 category=params.get('category', ''),
+                                 limit=int(params.get('limit', 100)),
+                                 corpus=corpus)
+        if parts[0] == 'videos' and len(parts) == 2:
+            words = corpus.words[parts[1]]
+            result = {'category': corpus.categories[parts[1]],
+                      'text': ' '.join(w.text for w in words),
+                      'n_words': len(words)}
+            if int(params.get('words', 0)):
+                result['words'] = [
+                    {'text': w.text, 'start': w.start, 'end': w.end,
+                     'pos': w.pos, 'dep': w.dep, 'head': w.head}
+                    for w in words]
+            return result
+        if parts[0] == 'categories' and len(parts) == 1:
+            return corpus.category_counts
+        raise KeyError(f'Unknown endpoint {endpoint!r}.')
+
+    def contexts(self,
+                 text: str,
+                 window: int = 5,
+                 category: str = '',
+                 limit: int = 100,
+                 corpus: Optional[Corpus] = None) -> List[Dict[str, Any]]:
+        """Returns the contexts of a word (case-insensitive) from the index.
+
+        Args:
+            text (str): Word to look up.
+            window (int, optional): Number of words on each side of the word. Defaults to 5.
+            category (str, optional): Only return contexts from videos in this category or
+            one of its subcategories, e.g., 'fights' or 'fights/capoeira_beginners'.
+            Defaults to '' (all videos).
+            limit (int, optional): Maximum number of contexts. Defaults to 100.
+            corpus (Optional[Corpus], optional): Version of the corpus to search. Defaults
+            to the current one.
+        """
+        corpus = corpus or self.corpus
+        category = category.strip('/')
+        contexts = []
+        for video_id, i in corpus.index.get(normalize(text), []):
+            if len(contexts) >= limit:
+                break
+            path = corpus.categories[video_id]
+            if category and path != category and not path.startswith(category + '/'):
+                continue
+            words = corpus.words[video_id]
+            contexts.append({'video_id': video_id,
+                             'category': path,
+                             'start': words[i].start,
+                             'context': ' '.join(w.text for w in words[max(0, i - window):i + window + 1])})
+        return contexts
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service: QueryService = None
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        start = time.perf_counter()
+        try:
+            response = self.service.query(url.path, dict(parse_qsl(url.query)))
+            status = 200
+        except (KeyError, ValueError, TypeError) as e:
+            response, status = {'error': str(e)}, 404 if isinstance(e, KeyError) else 400
+        except Exception as e:
+            response, status = {'error': f'{type(e).__name__}: {e}'}, 500
+        response['seconds'] = round(time.perf_counter() - start, 4)
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(save_path: str, host: str = '127.0.0.1', port: int = 8765) -> None:
+    QueryHandler.service = QueryService(save_path)
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    print(f'Serving the videos from {save_path} on http://{host}:{port}')
+    server.serve_forever()
+
+
+def query(endpoint: str, host: str = '127.0.0.1', port: int = 8765, **params) -> Any:
+    """Queries a running service from a script or a notebook, e.g.,
+    query('analyses/analyze_pos_dep', n=10) or query('words', text='knee', window=3).
+    """
+    url = f'http://{host}:{port}/{endpoint.strip("/")}'
+    if params:
+        url += '?' + urlencode(params)
+    with urlopen(url) as f:
+        return json.load(f)['result']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save_path", default='/home/cayralat/xaines/videos_with_features.pickle', type=str,
+                        help="Path of the pickle file of the parsed videos (see `SubtitleReader.save`).")
+    parser.add_argument("--host", default='127.0.0.1', type=str,
+                        help="Host to listen on. Only use localhost unless you trust the network.")
+    parser.add_argument("--port", default=8765, type=int,
+                        help="Port to listen on.")
+    args = parser.parse_args()
+    serve(args.save_path, args.host, args.port)
@@ -1,11 +1,15 @@
 from __future__ import annotations
 from collections import abc, Counter
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+import fnmatch
 import pickle
+import warnings
+import random
 import os
-from typing import TextIO, Dict, Generator, Tuple
+from typing import TextIO, Dict, Generator, Iterable, List, Optional, Tuple
 
-from helpers import Video, Caption, Word, model
+from helpers import Video, Caption, Word, Annotator, model
 import utils
 
 SubtitleReaderNested = Dict[str, Dict[str, Video]]
@@ -13,7 +17,10 @@ SubtitleReaderNested = Dict[str, Dict[str, Video]]
 class SubtitleReader:
     def __init__(self,
                  vtt_folder: TextIO,
-                 save_path: TextIO = '') -> None:
+                 save_path: TextIO = '',
+                 annotator: Optional[Annotator] = None,
+                 include: Optional[List[str]] = None,
+                 exclude: Optional[List[str]] = None) -> None:
         """This class parses vtt subtitle files and stores them in an organized dictionary
         the hierarchy of which is the same as the directory hierarchy in which the subtitle
         files are stored. It returns a `SubtitlesReader` object which contains the parsed subtitles
@@ -23,59 +30,134 @@ class SubtitleReader:
             vtt_folder (TextIO): Path of the directory in which the subfolders are stored.
             save_path (TextIO, optional): Path of the pickle file to which we should save the
             subtitles object. Defaults to ''.
+            annotator (Optional[Annotator], optional): Annotator used to assign the features
+            (e.g., `Annotator('sm')` for a fast run). Defaults to `helpers.model`.
+            include (Optional[List[str]], optional): Glob patterns of the categories to read.
+            Defaults to None (all categories).
+            exclude (Optional[List[str]], optional): Glob patterns of the categories to skip.
+            Defaults to None.
         """
         self.vtt_folder = vtt_folder
-        self.videos, self.id_to_vid = self.read_videos(vtt_folder)
-        self.videos.assign_features(save_path)
+        self.videos, self.id_to_vid = self.read_videos(vtt_folder, include=include, exclude=exclude)
+        self.assign_features('', annotator=annotator)
 
         if save_path:
             self.save(save_path)
 
-    def read_videos(self, vtt_folder: TextIO) -> Tuple[Dict[str, SubtitleReaderNested], Dict[str, Video]]:
+    def read_videos(self,
+                    vtt_folder: TextIO,
+                    include: Optional[List[str]] = None,
+                    exclude: Optional[List[str]] = None) -> Tuple[Dict[str, SubtitleReaderNested], Dict[str, Video]]:
         """This method reads the subtitle files and stores them in a nested dictionaries
-        the hierarchy of which is the same as the subfolders hierarchy.
+        the hierarchy of which is the same as the subfolders hierarchy. If the same video ID
+        is found several times (in several categories, or several files in the same category),
+        only the first file is parsed and every category points to that same `Video` object
+        (so that it is annotated once, for all of them); the paths of all the files of such
+        IDs are stored in `self.duplicates`.
 
         Args:
             vtt_folder (TextIO): Path of the directory in which the subfolders are stored.
+            include (Optional[List[str]], optional): See `scan_vtt_files()`. Defaults to None.
+            exclude (Optional[List[str]], optional): See `scan_vtt_files()`. Defaults to None.
 
         Returns:
             Tuple[Dict, Dict]: The first dictionary contains nested dictionaries based on the
             structure of the subfolders. The second dictionary is a simple mapping between the
             videos and their IDs (there are no nested dictionaries).
         """
-
-        def set_leaf(tree, branches, leaf, bar):
-            """Example:
-            set_leaf(t, ['b1','b2','b3'], 'new_leaf') # {'b1': {'b2': {'b3': 'new_leaf'}}}
-            """
-            if len(branches) == 1:
-                tree[branches[0]] = leaf
-                return
-            if not tree.get(branches[0]):
-                tree[branches[0]] = {}
-            set_leaf(tree[branches[0]], branches[1:], leaf, bar)
-
-        startpath = vtt_folder
+        files = SubtitleReader.scan_vtt_files(vtt_folder, include=include, exclude=exclude)
         tree: SubtitleReaderNested = {}
         id_to_vid: Dict[str, Video] = {}
-        bar = tqdm(total=sum(len(x[2]) for x in list(os.walk(startpath))))
-        for root, dirs, files in os.walk(startpath):
-            branches = [startpath]
-            if root != startpath:
-                branches.extend(os.path.relpath(root, startpath).split('/'))
-            files_ = []
-            for f in files:
-                video = Video(os.path.join(root, f))
-                id = f.split('.')[0]
-                id_to_vid[id] = video
-                files_.append((id, video))
-                bar.update(1)
-            leaf = dict([(d, {}) for d in dirs] + files_)
-            set_leaf(tree, branches, leaf, bar)
-        return tree[vtt_folder], id_to_vid
+        paths: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        for branches, file_path in tqdm(files):
+            id = os.path.basename(file_path).split('.')[0]
+            # Not `get() or`, since a `Video` without words is falsy
+            video = id_to_vid[id] if id in id_to_vid else Video(file_path)
+            leaf = tree
+            for branch in branches:
+                leaf = leaf.setdefault(branch, {})
+            leaf[id] = video
+            id_to_vid.setdefault(id, video)
+            paths.setdefault(id, []).append((branches, file_path))
+
+        self.duplicates = {id: [file_path for _, file_path in p]
+                           for id, p in paths.items() if len(p) > 1}
+        if self.duplicates:
+            # Several files of the same ID can also be in the same category, e.g., the
+            # subtitles of a video in several languages (x.en.vtt and x.de.vtt)
+            categories = {id: Counter(branches for branches, _ in paths[id]) for id in self.duplicates}
+            n_categories = sum(len(c) > 1 for c in categories.values())
+            n_files = sum(max(c.values()) > 1 for c in categories.values())
+            warnings.warn(f'{n_categories} video IDs appear in several categories and {n_files} '
+                          'have several files in the same category; only the first file of '
+                          'each ID is read (see `duplicates`).')
+        return tree, id_to_vid
+
+    @staticmethod
+    def scan_vtt_files(vtt_folder: TextIO,
+                       include: Optional[List[str]] = None,
+                       exclude: Optional[List[str]] = None,
+                       max_workers: int = 16) -> List[Tuple[Tuple[str, ...], str]]:
+        """Lists the vtt files of a directory tree in a single walk. The directories of
+        each level are listed concurrently since listing is mostly spent waiting on the
+        file system (e.g., on network file systems).
+
+        Args:
+            vtt_folder (TextIO): Path of the directory in which the subfolders are stored.
+            include (Optional[List[str]], optional): Glob patterns of the category paths to
+            read, e.g., ['fights', 'dances/salsa*']. Patterns are matched one path segment
+            at a time, i.e., '*' does not match '/'. A category is included if it or any of
+            its parents matches, and directories which cannot lead to a match are not walked.
+            Defaults to None (all categories).
+            exclude (Optional[List[str]], optional): Glob patterns of the category paths to
+            skip, matched as `include`. Excluded directories are not walked. Defaults to None.
+            max_workers (int, optional): Number of threads listing directories. Defaults to 16.
+
+        Returns:
+            List[Tuple[Tuple[str, ...], str]]: The category path (e.g., ('fights',
+            'capoeira_beginners')) and the path of each file, sorted by path.
+        """
+
+        def matches_segments(branches, pattern):
+            return all(fnmatch.fnmatchcase(branch, segment)
+                       for branch, segment in zip(branches, pattern.split('/')))
+
+        def matches(branches, patterns):
+            """Whether the category or one of its parents matches one of the patterns."""
+            return any(len(pattern.split('/')) <= len(branches) and matches_segments(branches, pattern)
+                       for pattern in patterns)
+
+        def may_match(branches, patterns):
+            """Whether the category or one of its subcategories can match one of the patterns."""
+            return any(matches_segments(branches, pattern) for pattern in patterns)
+
+        def list_dir(branches):
+            with os.scandir(os.path.join(vtt_folder, *branches)) as it:
+                entries = [(entry.name, entry.path, entry.is_dir()) for entry in it]
+            return branches, entries
+
+        files = []
+        level = [()]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while level:
+                next_level = []
+                for branches, entries in executor.map(list_dir, level):
+                    for name, path, is_dir in entries:
+                        if is_dir:
+                            if exclude and matches(branches + (name,), exclude):
+                                continue
+                            if include and not may_match(branches + (name,), include):
+                                continue
+                            next_level.append(branches + (name,))
+                        elif name.endswith('.vtt') and (not include or matches(branches, include)):
+                            files.append((branches, path))
+                level = next_level
+        return sorted(files, key=lambda x: x[1])
 
     def assign_features(self,
-                        save_path: TextIO = 'videos_with_features.pickle') -> None:
+                        save_path: TextIO = 'videos_with_features.pickle',
+                        annotator: Optional[Annotator] = None,
+                        batch_size: int = 16) -> None:
         """This method runs the `spaCy` pipeline on each subtitle file which includes
         syntactic relations (`dep_` and `head`) and POS tagging (`pos_`). We only store
         the mentioned features because storing the whole analysis for each file would
@@ -84,9 +166,14 @@ class SubtitleReader:
         Args:
             save_path (TextIO, optional): Path of the `pickle` file to which we should save the
             subtitles object. Defaults to 'videos_with_features.pickle'.
+            annotator (Optional[Annotator], optional): Annotator to use. Defaults to `helpers.model`.
+            batch_size (int, optional): Number of videos passed to the annotator at once.
+            Defaults to 16.
         """
-        for video in tqdm(self.id_to_vid.values()):
-            analysis = video.analysis
+        annotator = annotator or model
+        videos = list(self.id_to_vid.values())
+        analyses = annotator.pipe((str(video) for video in videos), batch_size=batch_size)
+        for video, analysis in tqdm(zip(videos, analyses), total=len(videos)):
             analysis_text = analysis.text
             words = video.words
             i = 0
@@ -113,7 +200,8 @@ class SubtitleReader:
                 word.head = token_to_caption_word[word.head]
 
             assert i == len(words)
-        self.save(save_path)
+        if save_path:
+            self.save(save_path)
 
 
     @staticmethod
@@ -160,6 +248,68 @@ class SubtitleReader:
         are a key/value tuple which are the video category (key) and the `Video` object."""
         return self.nested_iter(self.videos)
 
+    def iter_with_categories(self,
+                             value=None,
+                             path: Tuple[str, ...] = ()) -> Generator[Tuple[Tuple[str, ...], str, Video]]:
+        """Same as `nested_iter()` but also yields the category path of each video,
+        e.g., (('fights', 'capoeira_beginners'), '3miio1kz3gc', video)."""
+        for k, v in (self.videos if value is None else value).items():
+            if isinstance(v, abc.Mapping):
+                yield from self.iter_with_categories(v, path + (k,))
+            else:
+                yield path, k, v
+
+    def strata(self, depth: int = 1) -> Dict[str, List[Tuple[str, Video]]]:
+        """Groups the videos by their category path truncated to `depth` levels
+        (e.g., 'fights' for a depth of 1, 'fights/capoeira_beginners' for 2). Videos
+        are sorted by ID inside each group so that sampling does not depend on the
+        order in which the files were read. A video which appears in several
+        subcategories of the same group is only kept once."""
+        strata: Dict[str, Dict[str, Video]] = {}
+        for path, video_id, video in self.iter_with_categories():
+            strata.setdefault('/'.join(path[:depth]), {}).setdefault(video_id, video)
+        return {name: sorted(content.items(), key=lambda x: x[0])
+                for name, content in sorted(strata.items())}
+
+    def sample_videos(self,
+                      n: int = 30,
+                      depth: int = 1,
+                      seed: int = 0,
+                      exclude: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[str, Video]]]:
+        """Draws a stratified sample of videos: `n` videos (or all of them if there
+        are fewer) from each category at the given depth. The same seed always gives
+        the same sample, and each category has its own random generator so that its
+        sample does not depend on the other categories.
+
+        Args:
+            n (int, optional): Number of videos per category. Defaults to 30.
+            depth (int, optional): Depth of the categories to stratify by. Defaults to 1.
+            seed (int, optional): Seed of the random generator. Defaults to 0.
+            exclude (Optional[Iterable[str]], optional): IDs of the videos which should not
+            be sampled, e.g., to draw a held-out sample. Defaults to None.
+
+        Returns:
+            Dict[str, List[Tuple[str, Video]]]: Sampled (ID, video) tuples per category.
+        """
+        exclude = set(exclude or ())
+        samples = {}
+        for name, content in self.strata(depth).items():
+            content = [(id, video) for id, video in content if id not in exclude]
+            samples[name] = random.Random(f'{seed}/{name}').sample(content, min(n, len(content)))
+        return samples
+
+    def sample_words(self,
+                     n: int = 10000,
+                     depth: int = 1,
+                     seed: int = 0) -> Dict[str, List[Word]]:
+        """Same as `sample_videos()` but draws `n` words from each category, uniformly
+        from all of the words of its videos."""
+        samples = {}
+        for name, content in self.strata(depth).items():
+            words = [word for _, video in content for word in video]
+            samples[name] = random.Random(f'{seed}/{name}').sample(words, min(n, len(words)))
+        return samples
+
 
 def main():
     # vtt_folder = '/hd2/data/cennet/impress/data/raw/YouCookII/youcook_vtt'
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip('webvtt')
+pytest.importorskip('spacy')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from helpers import Caption, Video, Word
+from columnar import export_parquet, load_parquet
+import subtitles_segmentations as ss
+
+
+def make_video(file_path, *captions):
+    video = Video.__new__(Video)
+    video.file_path = file_path
+    video.file_name = file_path
+    video.captions = []
+    for words in captions:
+        caption = Caption(is_word_aligned=True, start=0.0, end=1.0)
+        for text in words:
+            caption.append(Word(text, start=0.0, end=1.0, pos='NOUN', dep='ROOT', head=0))
+        video.captions.append(caption)
+    return video
+
+
+def make_reader():
+    shared = make_video('a.en.vtt', ['left', 'arm'], [], ['knee'])
+    videos = ss.SubtitleReader.__new__(ss.SubtitleReader)
+    videos.videos = {'fights': {'capoeira': {'a': shared}},
+                     'dance': {'a': shared,
+                               'b': make_video('b.en.vtt'),
+                               'c': make_video('c.en.vtt', ['x'] * 5)}}
+    videos.id_to_vid = {'a': shared,
+                        'b': videos.videos['dance']['b'],
+                        'c': videos.videos['dance']['c']}
+    videos.duplicates = {'a': ['fights/capoeira/a.en.vtt', 'dance/a.en.vtt']}
+    return videos
+
+
+def test_parquet_round_trip(tmp_path):
+    videos = make_reader()
+    export_parquet(videos, str(tmp_path))
+    loaded = load_parquet(str(tmp_path))
+    assert sorted((p, i, repr(v)) for p, i, v in loaded.iter_with_categories()) == \
+        sorted((p, i, repr(v)) for p, i, v in videos.iter_with_categories())
+    # The shared video is one object, with its empty caption, and not loaded twice
+    assert loaded.videos['fights']['capoeira']['a'] is loaded.videos['dance']['a']
+    assert [len(caption) for caption in loaded.id_to_vid['a'].captions] == [2, 0, 1]
+    # Videos without words are kept
+    assert loaded.videos['dance']['b'].captions == []
+    assert loaded.duplicates == videos.duplicates
+
+
+def test_export_parquet_row_groups(tmp_path):
+    export_parquet(make_reader(), str(tmp_path), row_group_size=2)
+    # 'dance' has 4 rows for 'a' (including its empty caption), 1 for 'b' and 5 for 'c'
+    metadata = pq.ParquetFile(str(tmp_path / 'category=dance' / 'part-0.parquet')).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [2] * 5
@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip('webvtt')
+pytest.importorskip('spacy')
+
+from helpers import Caption, Video, Word
+
+
+def make_video(*captions):
+    video = Video.__new__(Video)
+    video.captions = []
+    for words in captions:
+        caption = Caption(is_word_aligned=True)
+        for text, start, end in words:
+            caption.append(Word(text, start=start, end=end))
+        video.captions.append(caption)
+    return video
+
+
+def test_preprocess_split_words_keep_absolute_timestamps():
+    video = make_video([('a b c', 10.0, 13.0), ('d', 13.0, 14.0)],
+                       [('e', 14.0, 15.0)])
+    video._preprocess()
+    assert [(w.text, w.start, w.end) for w in video.captions[0]] == [
+        ('a', 10.0, 11.0), ('b', 11.0, 12.0), ('c', 12.0, 13.0), ('d', 13.0, 14.0)]
+    assert [(w.text, w.start, w.end) for w in video.captions[1]] == [('e', 14.0, 15.0)]
+
+
+def test_preprocess_split_word_without_end():
+    video = make_video([('f g', 15.0, None)])
+    video._preprocess()
+    assert [(w.text, w.start, w.end) for w in video.captions[0]] == [
+        ('f', 15.0, None), ('g', None, None)]
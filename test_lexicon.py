@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('webvtt')
+pytest.importorskip('spacy')
+
+from helpers import Word
+from lexicon import LexiconMatcher
+
+
+def words(text, pos=None):
+    return [Word(w, pos=pos) for w in text.split()]
+
+
+def spans(matches):
+    return [(m.lexicon, m.term, m.start, m.end) for m in matches]
+
+
+def test_match_longest_term_without_overlap():
+    matcher = LexiconMatcher({'x': ['lower back', 'back']})
+    assert spans(matcher.match(words('my lower back and Back.'))) == [
+        ('x', 'lower back', 1, 3), ('x', 'back', 4, 5)]
+
+
+def test_match_plurals_map_to_base_form():
+    matcher = LexiconMatcher({'body_parts': ['foot', 'arm']})
+    assert spans(matcher.match(words('Feet arms'))) == [
+        ('body_parts', 'foot', 0, 1), ('body_parts', 'arm', 1, 2)]
+
+
+def test_match_longer_term_at_end_of_words():
+    matcher = LexiconMatcher({'x': ['a b c', 'a b']})
+    assert spans(matcher.match(words('a b'))) == [('x', 'a b', 0, 2)]
+    matcher = LexiconMatcher({'body_parts': ['leg'], 'exercises': ['leg press']})
+    assert spans(matcher.match(words('my leg'))) == [('body_parts', 'leg', 1, 2)]
+
+
+def test_match_lexicons_are_independent():
+    matcher = LexiconMatcher({'body_parts': ['leg'], 'exercises': ['leg press']})
+    assert sorted(spans(matcher.match(words('do leg press now')))) == [
+        ('body_parts', 'leg', 1, 2), ('exercises', 'leg press', 1, 3)]
+
+
+def test_match_pos_of_last_word():
+    matcher = LexiconMatcher({'x': ['arm']})
+    assert matcher.match(words('arm', pos='VERB'), pos='NOUN') == []
+    assert len(matcher.match(words('arm,', pos='NOUN+PUNCT'), pos='NOUN')) == 1
+
+
+@pytest.mark.parametrize('term', ['', '  ', '-'])
+def test_terms_without_words_are_rejected(term):
+    with pytest.raises(ValueError, match='does not contain any word'):
+        LexiconMatcher({'x': [term]})
@@ -1,13 +1,17 @@
+from __future__ import annotations
 from collections import Counter
+from itertools import islice
 from tqdm import tqdm
 import pickle
 import os
 import csv
+import time
 from typing import Tuple
 
 import numpy as np
 
-from helpers import Video, Caption, Word, model
+from helpers import Video, Caption, Word, Annotator, model
+from lexicon import LexiconMatcher
 import subtitles_segmentations as ss
 
 BODY_PARTS = ['arm', 'eye', 'eyebrow', 'belly', 'leg', 'breast', 'thumb', 'elbow',
@@ -18,30 +22,86 @@ BODY_PARTS = ['arm', 'eye', 'eyebrow', 'belly', 'leg', 'breast', 'thumb', 'elbow
               'eyelash', 'lash', 'tooth', 'toe', 'tongue', 'muscle', 'lung', 'spine', 'stomach',
               'chest', 'abdominal', 'ab', 'hamstring', 'quadricep', 'quad', 'glute', 'bicep',
               'tricep', 'forearm', 'trap']
-BODY_PARTS_PLURAL = ['feet', 'calves', 'teeth'] + \
-    [bp + 's' for bp in BODY_PARTS]
-BODY_PARTS += BODY_PARTS_PLURAL
-BODY_PARTS = {bp: None for bp in BODY_PARTS}
+# Plurals (e.g., feet, calves) are generated by the matcher
+LEXICONS = {'body_parts': BODY_PARTS}
+LEXICON_MATCHER = LexiconMatcher(LEXICONS)
+
+def read_lines(path, skip=0):
+    """Streams the lines of a text file without loading it in memory."""
+    with open(path) as f:
+        for line in islice(f, skip, None):
+            yield line.strip()
+
 
 def analyze_pos_dep_english_sample(counters_path='/Users/chriscay/Library/Mobile Documents/com~apple~CloudDocs/Saarland Univeristy/Winter 2020-2021/hiwi/youtube_videos/counters_eng_sample.pickle',
-                                   reset=False):
-    counters = {'dep': Counter(), 'pos': Counter(), 'dep_pos': Counter()}
+                                   reset=False,
+                                   corpus_path='eng_sample.txt',
+                                   batch_size=256,
+                                   n_process=1,
+                                   checkpoint_every=10000,
+                                   annotator=None):
+    """Counts the `dep`, `pos` and `dep_pos` features of a reference English corpus. The
+    corpus is streamed line by line into `model.pipe()`, and the counters are saved to a
+    checkpoint file every `checkpoint_every` lines so that an interrupted run is resumed
+    from where it stopped.
+
+    Args:
+        counters_path (str, optional): Path of the `pickle` file of the final counters.
+        reset (bool, optional): Recompute the counters even if they were already saved.
+        Defaults to False.
+        corpus_path (str, optional): Path of the corpus (one text per line). Defaults to
+        'eng_sample.txt'.
+        batch_size (int, optional): Number of lines spaCy processes at once. Defaults to 256.
+        n_process (int, optional): Number of processes spaCy uses (see `Language.pipe`).
+        Defaults to 1.
+        checkpoint_every (int, optional): Number of lines between two checkpoints.
+        Defaults to 10000.
+        annotator (Annotator, optional): Annotator to use. Defaults to `helpers.model`.
+
+    Returns:
+        Dict: {'eng_sample': counters}, in the same format as `analyze_pos_dep()`.
+    """
+    checkpoint_path = counters_path + '.checkpoint'
     if reset or not os.path.exists(counters_path):
-        with open('eng_sample.txt') as f, open('counters_eng_sample.pickle', 'wb') as f_out:
-            corpus = f.readlines()
-            for line in tqdm(corpus[:len(corpus)//2]):
-                analysis = model(line)
-                counters['dep'].update(
-                    [token.dep_ for token in analysis])
-                counters['pos'].update(
-                    [token.pos_ for token in analysis])
-                counters['dep_pos'].update(
-                    [(token.dep_, token.pos_) for token in analysis])
-            pickle.dump(counters, f_out)
+        counters = {'dep': Counter(), 'pos': Counter(), 'dep_pos': Counter()}
+        lines_done = 0
+        annotator = annotator or model
+        # The checkpoint is only valid for the same corpus and annotator
+        source = {'corpus_path': os.path.abspath(corpus_path),
+                  'annotator': getattr(annotator, 'name', repr(annotator))}
+        if not reset and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'rb') as f:
+                checkpoint = pickle.load(f)
+            if checkpoint['source'] != source:
+                raise ValueError(f'The checkpoint {checkpoint_path} was computed from '
+                                 f'{checkpoint["source"]} and not from {source}. Use '
+                                 '`reset=True` to start over.')
+            counters, lines_done = checkpoint['counters'], checkpoint['lines_done']
+        lines = read_lines(corpus_path, skip=lines_done)
+        for analysis in tqdm(annotator.pipe(lines, batch_size=batch_size, n_process=n_process),
+                             initial=lines_done):
+            counters['dep'].update(
+                [token.dep_ for token in analysis])
+            counters['pos'].update(
+                [token.pos_ for token in analysis])
+            counters['dep_pos'].update(
+                [(token.dep_, token.pos_) for token in analysis])
+            lines_done += 1
+            if lines_done % checkpoint_every == 0:
+                # Write to a temporary file first so that an interrupted write does
+                # not corrupt the previous checkpoint
+                with open(checkpoint_path + '.tmp', 'wb') as f:
+                    pickle.dump({'source': source, 'counters': counters,
+                                 'lines_done': lines_done}, f)
+                os.replace(checkpoint_path + '.tmp', checkpoint_path)
+        with open(counters_path, 'wb') as f:
+            pickle.dump(counters, f)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
     else:
         with open(counters_path, 'rb') as f:
-            counters = {'eng_sample': pickle.load(f)}
-    return counters
+            counters = pickle.load(f)
+    return {'eng_sample': counters}
 
 
 def get_proportions_of_features(counters_videos, counter_eng_sample):
@@ -83,13 +143,10 @@ def get_subtree(videos, feature, value):
 
 
 def body_parts_counts(videos) -> Tuple[Counter, float]:
+    counts, total_words = LEXICON_MATCHER.counts(videos, pos='NOUN')
     body_parts = Counter()
-    total_words = 0
-    for video in videos.id_to_vid.values():
-        total_words += len(video)
-        for word in video.words:
-            if word.pos == 'NOUN' and word.text in BODY_PARTS:
-                body_parts.update([word.text])
+    for category_counts in counts.values():
+        body_parts += category_counts['body_parts']
     numer_body_parts = sum(n for n in body_parts.values())
     nouns = total_words * 0.16
     # 30% of nouns in our data are body parts
@@ -236,12 +293,15 @@ def verb_distribution_per_category(counters):
 def get_body_parts_and_contexts(videos):
     for video in tqdm(videos.id_to_vid.values()):
         contexts = []
-        for i, word in enumerate(video.words):
-            if word.pos == 'NOUN' and word.text in BODY_PARTS:
-                contexts.append([])
-                for x in range(3, 6):
-                    contexts[-1].append(
-                        ' '.join([w.text for w in video.words[max(0, i - x): i + x]]))
+        words = video.words
+        for match in LEXICON_MATCHER.match(words, pos='NOUN'):
+            if match.lexicon != 'body_parts':
+                continue
+            i = match.start
+            contexts.append([])
+            for x in range(3, 6):
+                contexts[-1].append(
+                    ' '.join([w.text for w in words[max(0, i - x): i + x]]))
         head, tail = os.path.split(video.file_path)
         if not os.path.isdir(os.path.join(head, 'bp')):
             os.mkdir(os.path.join(head, 'bp'))
@@ -255,43 +315,99 @@ def get_body_parts_and_contexts(videos):
                 print(file=f)
 
 
+def video_pos_dep(video):
+    """Counts the `dep`, `pos` and `dep_pos` features of a video from the features which
+    were stored by `SubtitleReader.assign_features()`. Words which spaCy split into
+    several tokens (e.g., 'NOUN+PART') are counted as separate tokens, as in the
+    English sample."""
+    counters = {'dep': Counter(), 'pos': Counter(), 'dep_pos': Counter()}
+    for word in video:
+        if word.pos is None:
+            continue
+        dep, pos = word.dep.split('+'), word.pos.split('+')
+        counters['dep'].update(dep)
+        counters['pos'].update(pos)
+        counters['dep_pos'].update(zip(dep, pos))
+    return counters
+
+
 def analyze_pos_dep(videos,
-                    counters_path='/Users/chriscay/Library/Mobile Documents/com~apple~CloudDocs/Saarland Univeristy/Winter 2020-2021/hiwi/youtube_videos/counters_videos.pickle',
-                    reset=False):
-    counters = {
-        'fights': {'dep': Counter(), 'pos': Counter(), 'dep_pos': Counter()},
-        'dances': {'dep': Counter(), 'pos': Counter(), 'dep_pos': Counter()},
-        'spots': {'dep': Counter(), 'pos': Counter(), 'dep_pos': Counter()}
-    }
-    if reset or not os.path.exists(counters_path):
-        for category, content in videos.videos.items():
-            print(category)
-            sub_cat_samples = 30 // len(content)
-            for subcategory, sub_content in content.items():
-                print(subcategory)
-                subcat_counter = 0
-                for i, (video_id, video) in enumerate(sub_content.items()):
-                    print(video_id)
-                    analysis = video.analysis
-                    counters[category]['dep'].update(
-                        [token.dep_ for token in analysis])
-                    counters[category]['pos'].update(
-                        [token.pos_ for token in analysis])
-                    counters[category]['dep_pos'].update(
-                        [(token.dep_, token.pos_) for token in analysis])
-                    subcat_counter += 1
-                    if i > sub_cat_samples:
-                        break
-                if subcat_counter > 30:
-                    break
-        with open(counters_path, 'wb') as f:
-            pickle.dump(counters, f)
-    else:
-        with open(counters_path, 'rb') as f:
-            counters = pickle.load(f)
+                    n=30,
+                    depth=1,
+                    seed=0):
+    """Counts the `dep`, `pos` and `dep_pos` features (see `video_pos_dep()`) of a
+    stratified sample of videos (see `SubtitleReader.sample_videos()`).
+
+    Args:
+        videos (ss.SubtitleReader): Object containing all the subtitles.
+        n (int, optional): Number of videos sampled from each category. Defaults to 30.
+        depth (int, optional): Depth of the categories to sample from. Defaults to 1.
+        seed (int, optional): Seed of the sample. Defaults to 0.
+
+    Returns:
+        Dict: Counters of each feature per category.
+    """
+    counters = {}
+    for category, sample in videos.sample_videos(n=n, depth=depth, seed=seed).items():
+        counters[category] = {'dep': Counter(), 'pos': Counter(), 'dep_pos': Counter()}
+        for _, video in sample:
+            for f, f_counter in video_pos_dep(video).items():
+                counters[category][f] += f_counter
     return counters
 
 
+def get_confidence_intervals(videos,
+                             n=30,
+                             depth=1,
+                             seed=0,
+                             level=0.95,
+                             n_bootstrap=1000):
+    """Computes the proportion of each feature value in the sample of `analyze_pos_dep()`
+    (same arguments) with a bootstrap confidence interval. Since the tokens of a video
+    are not independent of each other, the videos (and not the tokens) of each category
+    are resampled.
+
+    Args:
+        videos (ss.SubtitleReader): Object containing all the subtitles.
+        n (int, optional): Number of videos sampled from each category. Defaults to 30.
+        depth (int, optional): Depth of the categories to sample from. Defaults to 1.
+        seed (int, optional): Seed of the sample and of the bootstrap. Defaults to 0.
+        level (float, optional): Confidence level of the intervals. Defaults to 0.95.
+        n_bootstrap (int, optional): Number of bootstrap resamples. Defaults to 1000.
+
+    Returns:
+        Dict: {category: {feature: {value: (proportion, low, high)}}}
+    """
+    rng = np.random.default_rng(seed)
+    quantiles = [(1 - level) / 2, (1 + level) / 2]
+    intervals = {}
+    for category, sample in videos.sample_videos(n=n, depth=depth, seed=seed).items():
+        intervals[category] = {}
+        per_video = [video_pos_dep(video) for _, video in sample]
+        if not per_video:
+            continue
+        # Number of times each video is drawn in each resample
+        weights = rng.multinomial(len(per_video), [1 / len(per_video)] * len(per_video),
+                                  size=n_bootstrap)
+        for f in ('dep', 'pos', 'dep_pos'):
+            total = sum((counters[f] for counters in per_video), Counter())
+            values = [value for value, _ in total.most_common()]
+            # videos x values
+            counts = np.array([[counters[f][value] for value in values]
+                               for counters in per_video], dtype=float)
+            resampled = weights @ counts
+            sums = resampled.sum(axis=1, keepdims=True)
+            proportions = np.divide(resampled, sums, out=np.zeros_like(resampled),
+                                    where=sums > 0)
+            low, high = np.quantile(proportions, quantiles, axis=0)
+            n_tokens = sum(total.values())
+            intervals[category][f] = {
+                value: (round(total[value] / n_tokens, 4), round(float(low[j]), 4),
+                        round(float(high[j]), 4))
+                for j, value in enumerate(values)}
+    return intervals
+
+
 def get_contexts(video):
     head, tail = os.path.split(video.file_path)
     contexts = {}
@@ -331,3 +447,58 @@ def write_to_csv(analysis):
     with open("results1.csv", "w", newline="") as f:
         writer = csv.writer(f)
         writer.writerows(csv_file)
+
+
+def benchmark_annotators(videos,
+                         tiers=('sm', 'md', 'lg'),
+                         reference='trf',
+                         n=5,
+                         seed=1,
+                         batch_size=16,
+                         analysis_sample=None):
+    """Measures the speed of each annotator tier and the agreement of its POS tags with
+    the reference tier on a held-out sample of videos (`n` videos per category), which
+    excludes the videos of the sample `analyze_pos_dep()` uses.
+
+    Args:
+        videos (ss.SubtitleReader): Object containing all the subtitles.
+        tiers (Tuple[str], optional): Tiers to benchmark. Defaults to ('sm', 'md', 'lg').
+        reference (str, optional): Tier the others are compared against. Defaults to 'trf'.
+        n (int, optional): Number of videos per category. Defaults to 5.
+        seed (int, optional): Seed of the sample. Defaults to 1.
+        batch_size (int, optional): Batch size of `Annotator.pipe()`. Defaults to 16.
+        analysis_sample (Dict, optional): Arguments of the `analyze_pos_dep()` sample to
+        exclude. Defaults to its default arguments (n=30, depth=1, seed=0).
+
+    Returns:
+        Dict: {tier: {'tokens_per_second': float, 'pos_agreement': float}}, from the
+        fastest to the slowest tier.
+    """
+    excluded = [video_id for sample in videos.sample_videos(
+        **(analysis_sample or {'n': 30, 'depth': 1, 'seed': 0})).values() for video_id, _ in sample]
+    texts = [str(video) for sample in videos.sample_videos(n=n, seed=seed, exclude=excluded).values()
+             for _, video in sample]
+    report, reference_pos = {}, None
+    for tier in (reference,) + tuple(t for t in tiers if t != reference):
+        annotator = Annotator(tier)
+        annotator.nlp  # Do not count the loading time
+        start = time.perf_counter()
+        docs = list(annotator.pipe(texts, batch_size=batch_size))
+        elapsed = time.perf_counter() - start
+        # Tokens are identified by their position in the text in case the tokenizers differ
+        pos = {(i, token.idx, token.text): token.pos_
+               for i, doc in enumerate(docs) for token in doc}
+        if reference_pos is None:
+            reference_pos = pos
+        agreement = sum(pos.get(k) == v for k, v in reference_pos.items())
+        report[tier] = {'tokens_per_second': round(len(pos) / elapsed, 1),
+                        'pos_agreement': round(agreement / len(reference_pos), 4)}
+    return dict(sorted(report.items(), key=lambda x: x[1]['tokens_per_second'], reverse=True))
+
+
+def select_annotator(report, min_pos_agreement=0.95) -> Annotator:
+    """Returns the fastest annotator of a `benchmark_annotators()` report whose POS
+    agreement is at least `min_pos_agreement` (the reference always qualifies)."""
+    for tier, scores in report.items():
+        if scores['pos_agreement'] >= min_pos_agreement:
+            return Annotator(tier)